@@ -12,6 +12,9 @@ from cfutils.icpctools.feed_generator import (
     ContestTeam,
 )
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gsheet-scripts"))
+from LocalStandings import derive_contest  # noqa: E402
+
 
 ### GLOBAL, DO NOT EDIT HERE
 team_map: dict[str, str] = {}
@@ -35,25 +38,40 @@ class MyConfig(CFContestConfig):
             return self.regions[0]  # default region
 
 
-def cli():
+@click.command()
+@click.option("--contest-id", type=int, default=496804, show_default=True)
+@click.option(
+    "--cache-dir",
+    default=".",
+    show_default=True,
+    help="cache directory of a finished contest's submissions and the standings derived from them. "
+    "A CF standings dump there (standings.json) is used to cross-check the derived standings.",
+)
+@click.option("--feed-file", default="./feed.json", show_default=True)
+@click.option("--auth/--no-auth", default=True, show_default=True)
+@click.option("--as-manager/--no-as-manager", "asManager", default=True, show_default=True)
+@click.option("--unofficial/--no-unofficial", default=False, show_default=True)
+@click.option("--teams-pickle", default="../gsheet-scripts/team_map.pkl", show_default=True)
+@click.option(
+    "--remove-unregistered-teams/--keep-unregistered-teams",
+    default=False,
+    show_default=True,
+    help="remove ranklist teams that are NOT in the gsheets pickle.",
+)
+def cli(
+    contest_id: int,
+    cache_dir: str,
+    feed_file: str,
+    auth: bool,
+    asManager: bool,
+    unofficial: bool,
+    teams_pickle: str,
+    remove_unregistered_teams: bool,
+):
     """
-    Usage: python feed_27_8_23.py
+    Usage: python feed_27_8_23.py [OPTIONS]
     """
 
-    # <config>
-    contest_id = 496804
-    status_file = "./status.json"
-    standings_file = "./standings.json"
-    feed_file = "./feed.json"
-    auth = True
-    asManager = True
-    unofficial = False
-
-    teams_pickle = "../gsheet-scripts/team_map.pkl"
-    # remove ranklist teams that are NOT in the gsheets pickle.
-    remove_unregistered_teams = False
-    # </config>
-
     with open(teams_pickle, "rb") as inf:
         raw_team_map = pickle.load(inf)
 
@@ -73,18 +91,17 @@ def cli():
         assert os.getenv("CODEFORCES_API_KEY") is not None
         assert os.getenv("CODEFORCES_API_SECRET") is not None
 
-    # get contest data from codeforces
-    submissions: list[cf.Submission] = cf.Contest_Status(
-        asManager=asManager, contestId=contest_id, From=1, count=25000
-    ).get(auth=auth, output_file=status_file, load_from_file=status_file)
-
-    standings: cf.Contest_Standings.Result = cf.Contest_Standings(
+    # get contest data from codeforces, the standings are computed from the submissions
+    # (both come from the same snapshot, which is only cached once the contest is finished)
+    standings: cf.Contest_Standings.Result
+    submissions: list[cf.Submission]
+    standings, submissions = derive_contest(
+        contest_id=contest_id,
+        cache_dir=cache_dir,
+        auth=auth,
         asManager=asManager,
-        contestId=contest_id,
-        From=1,
-        count=10000,
-        showUnofficial=unofficial,
-    ).get(auth=auth, output_file=standings_file, load_from_file=standings_file)
+        unofficial=unofficial,
+    )
 
     # generate the event feed
     feedGen = EventFeedFromCFContest(
@@ -2,6 +2,7 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from enum import StrEnum
 from dataclasses import dataclass
+from collections import defaultdict
 import cfutils.api as cf
 import pickle
 import os
@@ -46,26 +47,111 @@ class Team:
         return hash((self.name, self.institute, tuple(self.members), tuple(self.alts), tuple(self.emails)))
 
 
+def hash_team(team_name: str, handles: list[str]) -> str:
+    """Key a team by its name and sorted member handles, so the key does not depend on the order of the members."""
+    name = team_name + "#"
+    for handle in sorted(handles):
+        name += handle + "#"
+    return name
+
+
+class SheetReader:
+    """Reads only the requested form columns of a worksheet, and only when the spreadsheet has changed."""
+
+    def __init__(self, spreadsheet: gspread.Spreadsheet, worksheet_index: int = 0, layout: list[int] = None):
+        """
+        Initialize the SheetReader.
+        Args:
+            spreadsheet (gspread.Spreadsheet): The opened spreadsheet.
+            worksheet_index (int): Optional. Index of the worksheet holding the form responses.
+            layout (list[int]): Optional. Column indices found by the last read, tried first on the next one.
+        """
+        self.spreadsheet = spreadsheet
+        self.worksheet = spreadsheet.get_worksheet(worksheet_index)
+        self.layout = layout
+
+    def revision(self) -> str:
+        """Get the last modification time of the spreadsheet from Drive (a single metadata request)."""
+        if hasattr(self.spreadsheet, "get_lastUpdateTime"):
+            return self.spreadsheet.get_lastUpdateTime()
+        return self.spreadsheet.lastUpdateTime
+
+    def is_stale(self, known_revision: str | None) -> bool:
+        """Check whether the spreadsheet was modified since known_revision was recorded."""
+        return known_revision is None or self.revision() != known_revision
+
+    @staticmethod
+    def column_letter(index: int) -> str:
+        """Convert a 0-based column index to its A1 letter (0 -> A, 26 -> AA)."""
+        letters = ""
+        index += 1
+        while index:
+            index, rem = divmod(index - 1, 26)
+            letters = chr(ord('A') + rem) + letters
+        return letters
+
+    def column_ranges(self, indices: list[int]) -> list[str]:
+        """Get the A1 ranges of the given columns, header row excluded."""
+        return ["{col}2:{col}".format(col=self.column_letter(i)) for i in indices]
+
+    def read(self, columns: list[FormHeaders]) -> tuple[list[str], list[list[str]]]:
+        """
+        Download only the given columns. The header row is read in the same batched request as the columns of
+        the last known layout, a second request is only needed on the first read or if the form columns moved.
+        Args:
+            columns (list[FormHeaders]): Headers of the columns to fetch. Repeated headers
+                                         (one per team member) are all fetched.
+        Returns:
+            tuple[list[str], list[list[str]]]: The projected headers and the projected rows (header row excluded).
+        """
+        wanted = {str(column) for column in columns}
+        value_ranges = self.worksheet.batch_get(["1:1"] + self.column_ranges(self.layout or []),
+                                                major_dimension="COLUMNS")
+        all_headers = [cell[0].strip() if cell else "" for cell in value_ranges[0]]
+        indices = [i for i, column_name in enumerate(all_headers) if column_name in wanted]
+        if not indices:
+            self.layout = []
+            return [], []
+        if indices != self.layout:
+            value_ranges = [None] + self.worksheet.batch_get(self.column_ranges(indices), major_dimension="COLUMNS")
+            self.layout = indices
+
+        # Trailing empty cells are omitted by the API, so pad every column to the longest one.
+        columns_data = [value_range[0] if value_range else [] for value_range in value_ranges[1:]]
+        num_rows = max(len(column) for column in columns_data)
+        rows = [[column[r] if r < len(column) else "" for column in columns_data] for r in range(num_rows)]
+        return [all_headers[i] for i in indices], rows
+
+
 class GSheetInterface:
     """Class for interacting with Google Sheets and handling teams data."""
 
-    def __init__(self, keyfile: str, spreadsheet_title: str, cache_file: str = None, handles_cache_file: str = None):
+    # Columns used to construct teams; phone and discord fields are never downloaded.
+    TEAM_COLUMNS = [FormHeaders.GMAIL, FormHeaders.TEAM, FormHeaders.INSTITUTE, FormHeaders.ALTS_CSV,
+                    FormHeaders.NAME, FormHeaders.HANDLE, FormHeaders.EMAIL]
+
+    def __init__(self, keyfile: str, spreadsheet_title: str, cache_file: str = None, handles_cache_file: str = None,
+                 check_revision: bool = True):
         """
         Initialize the GSheetInterface.
         Args:
             keyfile (str): Path to the Google Sheets keyfile.
             spreadsheet_title (str): Title of the Google Sheets spreadsheet.
             cache_file (str): Optional. Path to the cache file for storing data.
+            check_revision (bool): Optional. Re-fetch the cached sheet if it was modified since it was cached.
 
         """
         self.scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         self.credentials = ServiceAccountCredentials.from_json_keyfile_name(keyfile, self.scope)
         self.client = gspread.authorize(self.credentials)
-        self.spreadsheet = self.client.open(spreadsheet_title).get_worksheet(0)
+        self.reader = SheetReader(self.client.open(spreadsheet_title))
+        self.spreadsheet = self.reader.worksheet
         self.headers = []
         self.teams = []
         self.error_logs = []
         self.rated_handles = []
+        self.handle_index = {}
+        self.revision = None
         handles_cache_file = handles_cache_file if handles_cache_file is not None else "cache/rated_handles.json"
         cache_file = cache_file if cache_file is not None else "cache/cached_sheet_interface.pkl"
         os.makedirs(os.path.dirname(handles_cache_file), exist_ok=True)
@@ -75,6 +161,10 @@ class GSheetInterface:
             self.__fetch__(cache_file)
         else:
             self.__load__(cache_file)
+            if check_revision and self.reader.is_stale(self.revision):
+                print("Sheet modified since it was cached. Fetching again...")
+                self.teams, self.error_logs = [], []
+                self.__fetch__(cache_file)
 
     def __cache_rated_handles__(self, cache_file: str):
         try:
@@ -143,11 +233,14 @@ class GSheetInterface:
 
     def __fetch__(self, cache_file: str):
         """Fetch data from Google Sheets and populate teams and error_logs."""
-        data = self.spreadsheet.get_all_values()
-        self.headers = [column_name.strip() for column_name in data[0]]
-        num_teams = len(data) - 1
+        # Read the revision first so that edits made during the fetch mark the cache as stale.
+        self.revision = self.reader.revision()
+        self.headers, data = self.reader.read(self.TEAM_COLUMNS)
+        num_teams = len(data)
+        # Institute emails of every constructed team, the form's own "Email Address" is not used to find collisions
+        institute_emails = []
 
-        for team_id, row in enumerate(data[1:]):
+        for team_id, row in enumerate(data):
             print("Processing team {id}/{num_teams}".format(id=team_id + 1, num_teams=num_teams))
             team_dict = {column_name: [] for column_name in self.headers}
 
@@ -156,21 +249,117 @@ class GSheetInterface:
                     team_dict[self.headers[i]].append(column_value.strip())
             try:
                 self.teams.append(self.construct_team(team_dict))
+                institute_emails.append(team_dict[FormHeaders.EMAIL])
                 print(self.teams[len(self.teams)-1])
             except InvalidTeamError:
                 pass
             print("Errors logged: {num_errors}\n".format(num_errors=len(self.error_logs)))
 
+        self.__detect_collisions__(institute_emails)
+        print("Errors logged after collision detection: {num_errors}\n".format(num_errors=len(self.error_logs)))
+
+        self.__index_handles__()
+
         if cache_file is not None:
             with open(cache_file, 'wb') as dump_file:
                 pickle.dump(self.teams, dump_file)
                 pickle.dump(self.error_logs, dump_file)
+                pickle.dump(self.revision, dump_file)
+                pickle.dump(self.reader.layout, dump_file)
+
+    @staticmethod
+    def __team_keys__(team: Team, institute_emails: list[str]) -> dict[str, str]:
+        """
+        Get the keys identifying a team, lower cased, with their kind.
+        Only institute emails are used: several teams are often registered from one organizer's Google account.
+        """
+        keys = {email.lower(): "email" for email in institute_emails}
+        keys.update({handle.lower(): "handle" for handle in [member.handle for member in team.members] + team.alts})
+        return keys
+
+    def __detect_collisions__(self, institute_emails: list[list[str]]):
+        """
+        Find teams sharing a CF handle, alt or institute email, and log every such cluster of teams in error_logs.
+        Teams are merged with a union-find over the handle/email -> teams index, which takes near-linear time.
+        Args:
+            institute_emails (list[list[str]]): The institute emails of every team, in the order of teams.
+        """
+        parent = list(range(len(self.teams)))
+        size = [1] * len(self.teams)
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        owners = defaultdict(list)
+        kinds = {}
+        for i, team in enumerate(self.teams):
+            team_keys = self.__team_keys__(team, institute_emails[i])
+            kinds.update(team_keys)
+            for key in team_keys:
+                if owners[key]:
+                    a, b = find(owners[key][0]), find(i)
+                    if a != b:
+                        if size[a] < size[b]:
+                            a, b = b, a
+                        parent[b] = a
+                        size[a] += size[b]
+                owners[key].append(i)
+
+        clusters = defaultdict(list)
+        for i in range(len(self.teams)):
+            clusters[find(i)].append(i)
+        shared = defaultdict(list)
+        for key, teams in owners.items():
+            if len(teams) > 1:
+                shared[find(teams[0])].append("{kind} {key}".format(kind=kinds[key], key=key))
+
+        # One entry per cluster, filed under its first team
+        for root, keys in shared.items():
+            first = self.teams[clusters[root][0]]
+            members = ["{name} ({institute})".format(name=self.teams[i].name, institute=self.teams[i].institute)
+                       for i in clusters[root]]
+            self.error_logs.append((first.institute, first.name,
+                                    ["Conflicting registrations: {members}, shared: {keys}".format(
+                                        members=", ".join(members), keys=", ".join(sorted(keys)))]))
+
+    def __index_handles__(self):
+        """Build the handle/alt -> teams index used by find_team."""
+        self.handle_index = defaultdict(list)
+        for team in self.teams:
+            for handle in {handle.lower() for handle in [member.handle for member in team.members] + team.alts}:
+                self.handle_index[handle].append(team)
+
+    def find_team(self, name: str, handles: list[str]) -> Team | None:
+        """
+        Get the registered team called name (case insensitive) that the CF handles belong to.
+        Returns:
+            Team | None: The team, None if no registration matches or several different ones do.
+        """
+        teams = {id(team): team for handle in handles for team in self.handle_index.get(handle.lower(), [])
+                 if team.name.lower() == name.lower()}
+        if len(teams) > 1:
+            print("Ambiguous team {name} ({handles}): {teams}".format(
+                name=name, handles=", ".join(handles),
+                teams=", ".join("{name} ({institute})".format(name=team.name, institute=team.institute)
+                                for team in teams.values())))
+            return None
+        return next(iter(teams.values()), None)
 
     def __load__(self, cache_file: str):
         """Load data from the cache file."""
         with open(cache_file, 'rb') as dump_file:
             self.teams = pickle.load(dump_file)
             self.error_logs = pickle.load(dump_file)
+            try:
+                self.revision = pickle.load(dump_file)
+                self.reader.layout = pickle.load(dump_file)
+            except EOFError:
+                # Caches written before revisions (or the column layout) were tracked
+                pass
+        self.__index_handles__()
 
     def get_all_handles(self) -> set:
         """Get all CF handles from the teams and alts."""
@@ -0,0 +1,113 @@
+import cfutils.api as cf
+from dataclasses import dataclass
+import pickle
+import os
+import time
+
+
+@dataclass(frozen=True)
+class GymEntry:
+    name: str
+    type: cf.ContestType
+    phase: str
+    durationSeconds: int
+    difficulty: int | None
+    updated: float
+
+
+class GymCatalog:
+    """Incrementally refreshed catalog of CF gym contests, keyed by contest id."""
+
+    def __init__(self, cache_file: str = None, max_age_seconds: int = 24 * 60 * 60):
+        """
+        Initialize the GymCatalog.
+        Args:
+            cache_file (str): Optional. Path to the cache file for storing the catalog.
+            max_age_seconds (int): Optional. Refresh from the API when the catalog is older than this.
+        """
+        self.cache_file = cache_file if cache_file is not None else "cache/gym_catalog.pkl"
+        self.max_age_seconds = max_age_seconds
+        self.gyms: dict[int, GymEntry] = {}
+        self.watermark = 0.0
+        self.candidates: set[int] = set()
+        if os.path.exists(self.cache_file):
+            self.__load__()
+
+    @staticmethod
+    def is_candidate(entry: GymEntry) -> bool:
+        """Check if a gym is a 5 hour ICPC style gym of difficulty at least 4."""
+        return entry.type == cf.ContestType.ICPC and entry.durationSeconds == 18000 and \
+            entry.difficulty is not None and entry.difficulty >= 4
+
+    def merge(self, contests: list, refresh_time: float) -> set[int]:
+        """
+        Merge API results into the catalog by contest id. Gyms missing from the results are removed.
+        Args:
+            contests (list): Contests as returned by cf.Contest_List(gym=True).
+            refresh_time (float): Time of the refresh, recorded on every added or changed entry.
+        Returns:
+            set[int]: Ids of the gyms that were added or changed.
+        """
+        changed = set()
+        removed = self.gyms.keys() - {contest.id for contest in contests}
+        for gym_id in removed:
+            del self.gyms[gym_id]
+            self.candidates.discard(gym_id)
+        for contest in contests:
+            entry = GymEntry(name=contest.name, type=contest.type, phase=str(contest.phase),
+                             durationSeconds=contest.durationSeconds, difficulty=contest.difficulty,
+                             updated=refresh_time)
+            old = self.gyms.get(contest.id)
+            if old is not None and (old.name, old.type, old.phase, old.durationSeconds, old.difficulty) == \
+                    (entry.name, entry.type, entry.phase, entry.durationSeconds, entry.difficulty):
+                continue
+            self.gyms[contest.id] = entry
+            changed.add(contest.id)
+            if self.is_candidate(entry):
+                self.candidates.add(contest.id)
+            else:
+                self.candidates.discard(contest.id)
+        self.watermark = refresh_time
+        return changed
+
+    def refresh(self, force: bool = False) -> set[int]:
+        """
+        Fetch the gym list from the API and merge it, unless the catalog is fresh enough.
+        Returns:
+            set[int]: Ids of the gyms that were added or changed.
+        """
+        now = time.time()
+        if not force and now - self.watermark < self.max_age_seconds:
+            return set()
+        exp_delay = 1
+        while True:
+            try:
+                contests = cf.Contest_List(gym=True).get()
+                break
+            except cf.CFAPIError:
+                raise
+            except Exception as e:
+                print("Network issue... Retrying. Error: {error}".format(error=e.__str__()))
+                time.sleep(exp_delay)
+                exp_delay = min(exp_delay * 2, 30)
+        changed = self.merge(contests, now)
+        self.__dump__()
+        return changed
+
+    def candidates_since(self, watermark: float) -> list[int]:
+        """Get the candidate gyms added or changed after watermark, in id order."""
+        return sorted(gym_id for gym_id in self.candidates if self.gyms[gym_id].updated > watermark)
+
+    def __dump__(self):
+        """Write the catalog to the cache file."""
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        with open(self.cache_file, 'wb') as dump_file:
+            pickle.dump(self.watermark, dump_file)
+            pickle.dump(self.gyms, dump_file)
+
+    def __load__(self):
+        """Load the catalog from the cache file."""
+        with open(self.cache_file, 'rb') as dump_file:
+            self.watermark = pickle.load(dump_file)
+            self.gyms = pickle.load(dump_file)
+        self.candidates = {gym_id for gym_id, entry in self.gyms.items() if self.is_candidate(entry)}
@@ -0,0 +1,237 @@
+import cfutils.api as cf
+import tempfile
+import hashlib
+import shutil
+import json
+import os
+import time
+
+'''
+ICPC standings are fully determined by the submissions, so instead of downloading both Contest_Status and
+Contest_Standings for a contest we download the status once (plus a one row standings request for the contest
+and problem list) and compute the ranklist locally. The result is written in the same format as a
+Contest_Standings dump and loaded back through cfutils, so every script gets the usual objects.
+'''
+
+# Verdicts that neither solve a problem nor count as a rejected attempt
+IGNORED_VERDICTS = {"COMPILATION_ERROR", "SKIPPED", "TESTING"}
+PENALTY_PER_REJECTED_ATTEMPT = 20
+OFFICIAL_PARTICIPANT_TYPES = {"CONTESTANT"}
+UNOFFICIAL_PARTICIPANT_TYPES = {"CONTESTANT", "VIRTUAL", "OUT_OF_COMPETITION"}
+# The status is returned newest first, a truncated dump would lose the earliest submissions of the contest
+STATUS_COUNT = 100000
+# Files written to a cache_dir. They have their own names so that dumps kept there by hand (like the status.json and
+# standings.json the feed used to write) are never overwritten or removed.
+STATUS_FILE = "contest-status.json"
+HEADER_FILE = "contest-header.json"
+# A Contest_Standings dump next to the cached files, derived standings are checked against it when present
+CF_STANDINGS_FILE = "standings.json"
+# Comment of the API error returned when calls are made too often, such calls are retried
+CALL_LIMIT_COMMENT = "Call limit exceeded"
+
+
+def party_key(party: dict) -> tuple:
+    """Identify a party by participant type and team id, or member handles if it is not a team."""
+    if party.get("teamId") is not None:
+        return party["participantType"], party["teamId"]
+    return party["participantType"], tuple(member["handle"] for member in party["members"])
+
+
+def compute_rows(submissions: list[dict], problems: list[dict], duration_seconds: int,
+                 unofficial: bool = False) -> list[dict]:
+    """
+    Compute ICPC standings rows from submissions in a single pass.
+    Args:
+        submissions (list[dict]): The "result" of a Contest_Status dump.
+        problems (list[dict]): The contest problems, in standings order.
+        duration_seconds (int): Contest duration. Later submissions are ignored.
+        unofficial (bool): Optional. Include virtual and out of competition participants.
+    Returns:
+        list[dict]: Ranklist rows in the Contest_Standings format, sorted by rank.
+    """
+    participant_types = UNOFFICIAL_PARTICIPANT_TYPES if unofficial else OFFICIAL_PARTICIPANT_TYPES
+    problem_ids = {problem["index"]: i for i, problem in enumerate(problems)}
+    rows = {}
+
+    for submission in sorted(submissions, key=lambda s: (s["relativeTimeSeconds"], s["id"])):
+        party = submission["author"]
+        if party["participantType"] not in participant_types or \
+                submission["relativeTimeSeconds"] > duration_seconds or \
+                submission["problem"]["index"] not in problem_ids:
+            continue
+        key = party_key(party)
+        if key not in rows:
+            rows[key] = {"party": party, "rank": 0, "points": 0.0, "penalty": 0,
+                         "successfulHackCount": 0, "unsuccessfulHackCount": 0,
+                         "problemResults": [{"points": 0.0, "rejectedAttemptCount": 0, "type": "FINAL"}
+                                            for _ in problems]}
+        row = rows[key]
+        result = row["problemResults"][problem_ids[submission["problem"]["index"]]]
+        verdict = submission.get("verdict")
+        if result["points"] > 0 or verdict is None or verdict in IGNORED_VERDICTS:
+            continue
+        if verdict == "OK":
+            result["points"] = 1.0
+            result["bestSubmissionTimeSeconds"] = submission["relativeTimeSeconds"]
+            row["points"] += 1.0
+            row["penalty"] += submission["relativeTimeSeconds"] // 60 + \
+                PENALTY_PER_REJECTED_ATTEMPT * result["rejectedAttemptCount"]
+        else:
+            result["rejectedAttemptCount"] += 1
+
+    ranklist = sorted(rows.values(), key=lambda r: (-r["points"], r["penalty"]))
+    for i, row in enumerate(ranklist):
+        tied = i > 0 and (row["points"], row["penalty"]) == (ranklist[i - 1]["points"], ranklist[i - 1]["penalty"])
+        row["rank"] = ranklist[i - 1]["rank"] if tied else i + 1
+    return ranklist
+
+
+def cross_check(rows: list[dict], cf_rows: list[dict]) -> list[str]:
+    """
+    Compare locally computed rows against rows of a Contest_Standings dump.
+    Returns:
+        list[str]: A description of every mismatch, empty if the standings agree.
+    """
+    def summary(row):
+        return row["points"], row["penalty"], [(result["points"], result["rejectedAttemptCount"],
+                                                result.get("bestSubmissionTimeSeconds"))
+                                               for result in row["problemResults"]]
+
+    mismatches = []
+    local = {party_key(row["party"]): row for row in rows}
+    remote = {party_key(row["party"]): row for row in cf_rows}
+    for key in local.keys() | remote.keys():
+        if key not in remote:
+            mismatches.append("{party} missing from CF standings".format(party=key))
+        elif key not in local:
+            mismatches.append("{party} missing from local standings".format(party=key))
+        elif summary(local[key]) != summary(remote[key]):
+            mismatches.append("{party}: local {local} != CF {remote}".format(party=key,
+                                                                             local=summary(local[key]),
+                                                                             remote=summary(remote[key])))
+    return mismatches
+
+
+def download(request, path: str, auth: bool):
+    """Download an API result to path with exponential backoff, unless it is already there."""
+    if os.path.exists(path):
+        return
+    exp_delay = 1
+    while True:
+        try:
+            request.get(auth=auth, output_file=path)
+            return
+        except cf.CFAPIError as e:
+            if CALL_LIMIT_COMMENT not in e.__str__():
+                raise
+            print("Call limit exceeded... Retrying.")
+            time.sleep(exp_delay)
+            exp_delay = min(exp_delay * 2, 30)
+        except Exception as e:
+            print("Network issue... Retrying. Error: {error}".format(error=e.__str__()))
+            time.sleep(exp_delay)
+            exp_delay = min(exp_delay * 2, 30)
+
+
+def cached_digest(cache_dir: str) -> str | None:
+    """Get a digest of the cached status and header of a finished contest, None if they are not cached."""
+    digest = hashlib.sha256()
+    for name in (STATUS_FILE, HEADER_FILE):
+        path = os.path.join(cache_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as inf:
+            digest.update(hashlib.sha256(inf.read()).hexdigest().encode())
+    return digest.hexdigest()
+
+
+def is_finished(contest) -> bool:
+    """Check if a contest (as returned by cfutils) is finished, only then are its submissions final."""
+    return str(getattr(contest.phase, "value", contest.phase)) == "FINISHED"
+
+
+def derive_contest(contest_id: int, cache_dir: str = None, auth: bool = True, asManager: bool = False,
+                   unofficial: bool = False) -> tuple[cf.Contest_Standings.Result, list[cf.Submission]]:
+    """
+    Get the standings of a contest computed locally from its submissions, together with those submissions.
+    Both come from the same status snapshot. See derive_standings for the arguments.
+    Returns:
+        tuple[cf.Contest_Standings.Result, list[cf.Submission]]: The standings, as returned by cf.Contest_Standings,
+        and the submissions, as returned by cf.Contest_Status.
+    """
+    return __derive__(contest_id, cache_dir, auth, asManager, unofficial, load_submissions=True)
+
+
+def derive_standings(contest_id: int, cache_dir: str = None, auth: bool = True, asManager: bool = False,
+                     unofficial: bool = False) -> cf.Contest_Standings.Result:
+    """
+    Get the standings of a contest, computed locally from its submissions.
+    Args:
+        contest_id (int): The contest id.
+        cache_dir (str): Optional. Directory for the status, header and derived standings of a finished contest,
+                         which are reused once present. Contests that are not finished yet, or calls without a
+                         cache_dir, are fetched again into a temporary directory every time.
+                         If it holds a CF standings dump (CF_STANDINGS_FILE), the result is checked against it.
+        auth (bool): Optional. Use the API keys from the environment.
+        asManager (bool): Optional. Download the status as a contest manager.
+        unofficial (bool): Optional. Include virtual and out of competition participants.
+    Returns:
+        cf.Contest_Standings.Result: The standings, as returned by cf.Contest_Standings.
+    """
+    return __derive__(contest_id, cache_dir, auth, asManager, unofficial, load_submissions=False)[0]
+
+
+def __derive__(contest_id: int, cache_dir: str | None, auth: bool, asManager: bool, unofficial: bool,
+               load_submissions: bool) -> tuple[cf.Contest_Standings.Result, list[cf.Submission] | None]:
+    """Derive the standings of a contest, and load its submissions if asked to."""
+    standings_name = "derived-standings-unofficial.json" if unofficial else "derived-standings.json"
+    request = cf.Contest_Standings(contestId=contest_id, From=1, count=1, asManager=asManager,
+                                   showUnofficial=unofficial)
+    status_request = cf.Contest_Status(contestId=contest_id, From=1, count=STATUS_COUNT, asManager=asManager)
+
+    def load(standings_file: str, status_file: str):
+        return request.get(auth=auth, load_from_file=standings_file), \
+            status_request.get(auth=auth, load_from_file=status_file) if load_submissions else None
+
+    # Derived standings are only ever written to cache_dir once the contest is finished
+    if cache_dir is not None and os.path.exists(os.path.join(cache_dir, standings_name)):
+        return load(os.path.join(cache_dir, standings_name), os.path.join(cache_dir, STATUS_FILE))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        header_file = os.path.join(tmp_dir, HEADER_FILE)
+        download(request, header_file, auth)
+        with open(header_file, 'r') as inf:
+            header = json.load(inf)["result"]
+        finished = cache_dir is not None and header["contest"]["phase"] == "FINISHED"
+
+        # The status of a finished contest may already be cached, e.g. by a call with the other unofficial flag
+        status_file = os.path.join(cache_dir if finished else tmp_dir, STATUS_FILE)
+        if not os.path.exists(status_file):
+            status_file = os.path.join(tmp_dir, STATUS_FILE)
+            download(status_request, status_file, auth)
+        standings_file = os.path.join(tmp_dir, standings_name)
+        with open(status_file, 'r') as inf:
+            submissions = json.load(inf)["result"]
+        if len(submissions) >= STATUS_COUNT:
+            print("Warning: status of contest {id} may be truncated, standings may be wrong".format(id=contest_id))
+
+        rows = compute_rows(submissions, header["problems"], header["contest"]["durationSeconds"], unofficial)
+        check_file = os.path.join(cache_dir, CF_STANDINGS_FILE) if cache_dir is not None else None
+        if check_file is not None and os.path.exists(check_file):
+            with open(check_file, 'r') as inf:
+                for mismatch in cross_check(rows, json.load(inf)["result"]["rows"]):
+                    print("Standings mismatch: {mismatch}".format(mismatch=mismatch))
+
+        with open(standings_file, 'w') as outf:
+            json.dump({"status": "OK", "result": {"contest": header["contest"], "problems": header["problems"],
+                                                  "rows": rows}}, outf)
+
+        if finished:
+            # Only files downloaded or computed here are moved into cache_dir, the standings last as they mark it done
+            os.makedirs(cache_dir, exist_ok=True)
+            for path in (status_file, header_file, standings_file):
+                if os.path.dirname(path) == tmp_dir:
+                    shutil.move(path, os.path.join(cache_dir, os.path.basename(path)))
+            standings_file = os.path.join(cache_dir, standings_name)
+            status_file = os.path.join(cache_dir, STATUS_FILE)
+        return load(standings_file, status_file)
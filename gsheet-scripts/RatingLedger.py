@@ -0,0 +1,159 @@
+from GSheetInterface import Team, hash_team
+import heapq
+import pickle
+import os
+
+
+def team_key(team: Team) -> str:
+    """Key a team by name and sorted member handles, which survives edits to its other registration details."""
+    return hash_team(team.name, [member.handle for member in team.members])
+
+
+class RatingLedger:
+    """Ledger of the (team key, rank, rating) tuples of every finished contest of the season.
+
+    Alongside the tuples, the best MIN_CONTESTS ratings of every team are kept in a min-heap, so appending a
+    contest only touches the teams that took part in it.
+    """
+
+    def __init__(self, ledger_file: str = None, min_contests: int = 5):
+        """
+        Initialize the RatingLedger.
+        Args:
+            ledger_file (str): Optional. Path to the file storing the ledger. Loaded if it exists.
+            min_contests (int): Optional. Number of contests a team needs to qualify, and the number of its
+                                best ratings that are averaged.
+        """
+        self.ledger_file = ledger_file if ledger_file is not None else "cache/rating_ledger.pkl"
+        self.min_contests = min_contests
+        self.contests: dict[int, list[tuple[str, int, float]]] = {}
+        self.digests: dict[int, str | None] = {}
+        self.registrations: dict[int, str | None] = {}
+        self.best_ratings: dict[str, list[float]] = {}
+        self.num_contests: dict[str, int] = {}
+        if os.path.exists(self.ledger_file):
+            self.__load__()
+
+    def __push__(self, best_ratings: dict[str, list[float]], num_contests: dict[str, int], key: str, rating: float):
+        """Add a rating to the running top min_contests of a team."""
+        best = best_ratings.setdefault(key, [])
+        num_contests[key] = num_contests.get(key, 0) + 1
+        if len(best) < self.min_contests:
+            heapq.heappush(best, rating)
+        elif rating > best[0]:
+            heapq.heapreplace(best, rating)
+
+    def __rebuild__(self, contest_ids) -> tuple[dict[str, list[float]], dict[str, int]]:
+        """Compute the running top ratings over the given ledger contests from their tuples."""
+        best_ratings, num_contests = {}, {}
+        for contest_id, entries in self.contests.items():
+            if contest_id in contest_ids:
+                for key, _, rating in entries:
+                    self.__push__(best_ratings, num_contests, key, rating)
+        return best_ratings, num_contests
+
+    def is_current(self, contest_id: int, digest: str | None, registrations: str | None) -> bool:
+        """
+        Check if a ledger contest was scored from the given inputs and registrations.
+        Args:
+            contest_id (int): The contest id.
+            digest (str): Digest of the contest inputs, None if they are not cached (they are then not compared).
+            registrations (str): Revision of the registrations, None if unknown (the contest is then never current).
+        """
+        return contest_id in self.contests and (digest is None or digest == self.digests.get(contest_id)) and \
+            registrations is not None and registrations == self.registrations.get(contest_id)
+
+    def append(self, contest_id: int, entries: list[tuple[str, int, float]], digest: str = None,
+               registrations: str = None):
+        """
+        Record the ratings of a finished contest.
+        Args:
+            contest_id (int): The contest id.
+            entries (list[tuple[str, int, float]]): (team key, rank, rating) of every team in the contest.
+            digest (str): Optional. Digest of the inputs the contest was scored from.
+            registrations (str): Optional. Revision of the registrations the teams were resolved against.
+        Raises:
+            ContestAlreadyFinalizedError: If the contest is already in the ledger.
+        """
+        if contest_id in self.contests:
+            raise ContestAlreadyFinalizedError("Contest {id} is already in the ledger.".format(id=contest_id))
+        self.contests[contest_id] = entries
+        self.digests[contest_id] = digest
+        self.registrations[contest_id] = registrations
+        for key, _, rating in entries:
+            self.__push__(self.best_ratings, self.num_contests, key, rating)
+        self.__dump__()
+
+    def replace(self, contest_id: int, entries: list[tuple[str, int, float]], digest: str = None,
+                registrations: str = None):
+        """
+        Replace the ratings of a ledger contest whose inputs or registrations changed.
+        The running top ratings are rebuilt.
+        """
+        self.contests[contest_id] = entries
+        self.digests[contest_id] = digest
+        self.registrations[contest_id] = registrations
+        self.best_ratings, self.num_contests = self.__rebuild__(self.contests)
+        self.__dump__()
+
+    def standings(self, contest_ids: list[int] = None,
+                  provisional: dict[int, list[tuple[str, int, float]]] = None
+                  ) -> tuple[list[tuple[str, float]], list[tuple[str, float]]]:
+        """
+        Get the final leaderboard.
+        Args:
+            contest_ids (list[int]): Optional. Ledger contests to count, all of them by default.
+            provisional (dict[int, list[tuple[str, int, float]]]): Optional. Entries of contests that are not
+                                                                  finished yet, counted but not recorded.
+        Returns:
+            tuple[list[tuple[str, float]], list[tuple[str, float]]]: (team key, rating) of the qualified and the
+            disqualified teams, best rating first. A team's rating is the average of its best min_contests ratings.
+        """
+        contest_ids = set(self.contests) if contest_ids is None else set(contest_ids).intersection(self.contests)
+        if contest_ids == set(self.contests) and not provisional:
+            best_ratings, num_contests = self.best_ratings, self.num_contests
+        else:
+            best_ratings, num_contests = self.__rebuild__(contest_ids)
+            for entries in (provisional or {}).values():
+                for key, _, rating in entries:
+                    self.__push__(best_ratings, num_contests, key, rating)
+
+        qualified, disqualified = [], []
+        for key, best in best_ratings.items():
+            rating = sum(sorted(best, reverse=True)) / len(best)
+            (qualified if num_contests[key] >= self.min_contests else disqualified).append((key, rating))
+        return sorted(qualified, key=lambda x: x[1], reverse=True), sorted(disqualified, key=lambda x: x[1],
+                                                                           reverse=True)
+
+    def __dump__(self):
+        """Write the ledger to the ledger file."""
+        os.makedirs(os.path.dirname(self.ledger_file) or ".", exist_ok=True)
+        with open(self.ledger_file, 'wb') as dump_file:
+            pickle.dump({"min_contests": self.min_contests,
+                         "contests": self.contests,
+                         "digests": self.digests,
+                         "registrations": self.registrations,
+                         "best_ratings": self.best_ratings,
+                         "num_contests": self.num_contests}, dump_file)
+
+    def __load__(self):
+        """Load the ledger from the ledger file."""
+        with open(self.ledger_file, 'rb') as dump_file:
+            data = pickle.load(dump_file)
+        if not isinstance(data, dict):
+            print("Ledger {file} has an old format, starting a new one.".format(file=self.ledger_file))
+            return
+        self.contests = data["contests"]
+        self.digests = data["digests"]
+        # Ledgers written before registrations were recorded get every contest rescored
+        self.registrations = data.get("registrations", {})
+        self.best_ratings = data["best_ratings"]
+        self.num_contests = data["num_contests"]
+        if data["min_contests"] != self.min_contests:
+            # The running top ratings were kept for a different MIN_CONTESTS, rebuild them from the tuples
+            self.best_ratings, self.num_contests = self.__rebuild__(self.contests)
+
+
+class ContestAlreadyFinalizedError(Exception):
+    """Custom exception class for appending a contest that is already in the ledger."""
+    pass
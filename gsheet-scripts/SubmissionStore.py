@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+import numpy as np
+from GSheetInterface import hash_team
+
+
+SUBMISSION_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("contest", np.int32),
+    ("problem", np.int16),
+    ("party", np.int32),
+    ("participant", np.int8),
+    ("time", np.int32),
+    ("verdict", np.int8),
+])
+
+
+def author_key(author: dict) -> str:
+    """Key a submission author the way registered teams are keyed (see hash_team), individuals have no team name."""
+    return hash_team(author.get("teamName") or "", [member["handle"] for member in author["members"]])
+
+
+class SubmissionStore:
+    """Columnar store of Contest_Status dumps for season wide analytics.
+
+    Submissions are kept in a single NumPy structured array. Problem indices, parties,
+    participant types and verdicts are dictionary encoded, so every query is a vectorized
+    scan over a few small integer columns.
+    """
+
+    def __init__(self, store_file: str = None):
+        """
+        Initialize the SubmissionStore.
+        Args:
+            store_file (str): Optional. Path to the .npz file backing the store. Loaded if it exists.
+        """
+        self.store_file = store_file if store_file is not None else "cache/submissions.npz"
+        self.submissions = np.empty(0, dtype=SUBMISSION_DTYPE)
+        self.problems: list[str] = []
+        self.parties: list[str] = []
+        self.participants: list[str] = []
+        self.verdicts: list[str] = []
+        self.__codes__ = {}
+        if os.path.exists(self.store_file):
+            self.__load__()
+
+    def __code__(self, column: str, value: str) -> int | None:
+        """Get the dictionary code of value in the dictionary of column, None if it was never seen."""
+        if column not in self.__codes__:
+            self.__codes__[column] = {v: i for i, v in enumerate(getattr(self, column))}
+        return self.__codes__[column].get(value)
+
+    def __encode__(self, column: str, value: str) -> int:
+        """Get the dictionary code of value in the dictionary of column, appending it if unseen."""
+        code = self.__code__(column, value)
+        if code is None:
+            table = getattr(self, column)
+            code = self.__codes__[column][value] = len(table)
+            table.append(value)
+        return code
+
+    def ingest(self, status_file: str) -> int:
+        """
+        Convert a Contest_Status JSON dump into columns and add it to the store.
+        Re-ingesting a contest replaces its previous submissions.
+        Args:
+            status_file (str): Path to the JSON dump written by cf.Contest_Status(...).get(output_file=...).
+        Returns:
+            int: Number of submissions ingested.
+        """
+        with open(status_file, "r") as inf:
+            result = json.load(inf)["result"]
+
+        rows = np.empty(len(result), dtype=SUBMISSION_DTYPE)
+        for i, submission in enumerate(result):
+            author = submission["author"]
+            rows[i] = (submission["id"],
+                       submission["contestId"],
+                       self.__encode__("problems", submission["problem"]["index"]),
+                       self.__encode__("parties", author_key(author)),
+                       self.__encode__("participants", author["participantType"]),
+                       submission["relativeTimeSeconds"],
+                       self.__encode__("verdicts", submission.get("verdict") or "TESTING"))
+
+        contests = np.unique(rows["contest"])
+        kept = self.submissions[~np.isin(self.submissions["contest"], contests)]
+        self.submissions = np.concatenate([kept, rows])
+        return len(rows)
+
+    def save(self):
+        """Write the store to store_file."""
+        os.makedirs(os.path.dirname(self.store_file) or ".", exist_ok=True)
+        np.savez_compressed(self.store_file,
+                            submissions=self.submissions,
+                            problems=np.array(self.problems, dtype=str),
+                            parties=np.array(self.parties, dtype=str),
+                            participants=np.array(self.participants, dtype=str),
+                            verdicts=np.array(self.verdicts, dtype=str))
+
+    def __load__(self):
+        """Load the store from store_file."""
+        with np.load(self.store_file, allow_pickle=False) as data:
+            self.submissions = data["submissions"]
+            self.problems = data["problems"].tolist()
+            self.parties = data["parties"].tolist()
+            self.participants = data["participants"].tolist()
+            self.verdicts = data["verdicts"].tolist()
+
+    def contests(self) -> list[int]:
+        """Get the ids of all ingested contests."""
+        return np.unique(self.submissions["contest"]).tolist()
+
+    def select(self, contest: int = None, problem: str = None, party: str = None,
+               participant: str = "CONTESTANT") -> np.ndarray:
+        """
+        Get the submissions matching all given filters.
+        Args:
+            contest (int): Optional. Contest id.
+            problem (str): Optional. Problem index, e.g. "A".
+            party (str): Optional. Party key as produced by author_key.
+            participant (str): Optional. Participant type, defaults to contestants only. None keeps all.
+        Returns:
+            np.ndarray: The matching rows of the submissions array.
+        """
+        mask = np.ones(len(self.submissions), dtype=bool)
+        for column, table, value in (("problem", "problems", problem),
+                                     ("party", "parties", party),
+                                     ("participant", "participants", participant)):
+            if value is None:
+                continue
+            code = self.__code__(table, value)
+            if code is None:
+                return self.submissions[:0]
+            mask &= self.submissions[column] == code
+        if contest is not None:
+            mask &= self.submissions["contest"] == contest
+        return self.submissions[mask]
+
+    def __first_accepted__(self, rows: np.ndarray) -> np.ndarray:
+        """Reduce rows to the earliest accepted submission of every (contest, problem, party)."""
+        ok = self.__code__("verdicts", "OK")
+        rows = rows[rows["verdict"] == ok] if ok is not None else rows[:0]
+        rows = rows[np.lexsort((rows["id"], rows["time"], rows["party"], rows["problem"], rows["contest"]))]
+        keys = np.stack([rows["contest"], rows["problem"], rows["party"]], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        return rows[np.sort(first)]
+
+    def solve_curve(self, contest: int, problem: str) -> np.ndarray:
+        """
+        Get the times at which parties solved a problem.
+        Returns:
+            np.ndarray: Sorted solve times in seconds; the i-th entry is when the problem reached i + 1 solves.
+        """
+        return np.sort(self.__first_accepted__(self.select(contest=contest, problem=problem))["time"])
+
+    def first_solves(self, contest: int) -> dict[str, tuple[int, str]]:
+        """
+        Get the first solve of every problem of a contest.
+        Returns:
+            dict[str, tuple[int, str]]: Problem index to (solve time, party key).
+        """
+        solves = self.__first_accepted__(self.select(contest=contest))
+        solves = solves[np.lexsort((solves["id"], solves["time"], solves["problem"]))]
+        _, first = np.unique(solves["problem"], return_index=True)
+        return {self.problems[row["problem"]]: (int(row["time"]), self.parties[row["party"]])
+                for row in solves[first]}
+
+    def verdict_distribution(self, contest: int = None, problem: str = None) -> dict[str, int]:
+        """Count submissions per verdict, optionally restricted to a contest and/or problem."""
+        counts = np.bincount(self.select(contest=contest, problem=problem)["verdict"], minlength=len(self.verdicts))
+        return {verdict: int(count) for verdict, count in zip(self.verdicts, counts) if count}
+
+    def team_activity(self, party: str) -> dict[int, tuple[int, int]]:
+        """
+        Get the season activity of a party.
+        Returns:
+            dict[int, tuple[int, int]]: Contest id to (number of submissions, number of problems solved).
+        """
+        rows = self.select(party=party)
+        contests, submitted = np.unique(rows["contest"], return_counts=True)
+        solved = np.bincount(np.searchsorted(contests, self.__first_accepted__(rows)["contest"]),
+                             minlength=len(contests))
+        return {int(c): (int(n), int(s)) for c, n, s in zip(contests, submitted, solved)}
+
+
+if __name__ == "__main__":
+    # Usage: python SubmissionStore.py <status.json> [<status.json> ...]
+    store = SubmissionStore()
+    for status_file in sys.argv[1:]:
+        print("Ingested {n} submissions from {file}".format(n=store.ingest(status_file), file=status_file))
+    store.save()
+    print("Store has {n} submissions over {c} contests".format(n=len(store.submissions), c=len(store.contests())))
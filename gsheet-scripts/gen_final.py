@@ -4,7 +4,8 @@ import os
 import cfutils.api as cf
 from enum import Enum
 from GSheetInterface import GSheetInterface
-from collections import defaultdict
+from LocalStandings import derive_standings, cached_digest, is_finished
+from RatingLedger import RatingLedger, team_key
 from tabulate import tabulate
 import datetime
 
@@ -22,9 +23,61 @@ class Keys(Enum):
     CODEFORCES_API_SECRET = "CODEFORCES_API_SECRET"
 
 contests_list = [470038, 1866, 472462, 473814, 476508, 479592, 481471, 484403, 496804]
-contest_data = []
+cache_dirs = {}
+try:
+    # Optionally: python gen_final.py <contest_id>[:<cache_dir>] ...
+    if len(sys.argv) > 1:
+        contests_list = []
+        for arg in sys.argv[1:]:
+            contest_id, _, cache_dir = arg.partition(':')
+            contests_list.append(int(contest_id))
+            cache_dirs[int(contest_id)] = cache_dir or None
+except ValueError:
+    print("Error: Invalid usage, valid contest IDs not provided.")
+    print("Usage: python {file_name} [<contest_id>[:<cache_dir>] ...]".format(file_name=sys.argv[0]))
+    exit(1)
+MIN_CONTESTS = 5
+Ledger = RatingLedger(min_contests=MIN_CONTESTS)
+
+Sheet = GSheetInterface(keyfile='../secrets/icpc-camp-service-account-creds.json',
+                        spreadsheet_title='Inter-College Competitive Programming Camp Registration (Responses)')
+
+'''
+GSheet has team_name and handles. Can generate unique key thanks to unique handles (till end of year).
+A party is resolved through the sheet's handle index, checking that the team name matches as well.
+'''
+# The ledger keys teams by team_key, they are resolved to the current registrations only for printing
+current_teams = {team_key(team): team for team in Sheet.teams}
+
+
+def get_institute(party):
+    team = Sheet.find_team(party.teamName, [m.handle for m in party.members])
+    return team.institute if team is not None else None
+
+
+def get_team(party):
+    return Sheet.find_team(party.teamName, [m.handle for m in party.members])
+
+
+def score_contest(rows):
+    rows = [row for row in rows if row.party.teamName is not None and get_institute(row.party) is not None]
+    max_solved = max(row.points for row in rows)
+    n = max(50, len(rows))
+    # Rows are already filtered down to registered teams, so the group rank is the position in the list
+    return [(team_key(get_team(row.party)), group_rank,
+             3000 * ((n - group_rank + 1) / n) * (row.points / max_solved))
+            for group_rank, row in enumerate(rows, start=1)]
 
+
+# Only contests missing from the ledger, or whose cached inputs or the registrations changed since they were scored,
+# are fetched (or read from the cache) and scored again, so that every week agrees with the current registrations
+# like gen_table does. Contests that are not finished yet are scored for display but not recorded.
+provisional = {}
 for contest_id in contests_list:
+    cache_dir = cache_dirs.get(contest_id)
+    digest = cached_digest(cache_dir) if cache_dir is not None else None
+    if (cache_dir is None or digest is not None) and Ledger.is_current(contest_id, digest, Sheet.revision):
+        continue
     try:
         if not load_dotenv():
             raise LoadDotenvError("Failed to load environment variables. Did you provide the .env file?")
@@ -32,91 +85,48 @@ for contest_id in contests_list:
             raise MissingEnvironmentVariableError(
                 "{api_key} or {api_secret} environment variables not set.".format(api_key=Keys.CODEFORCES_API_KEY.name,
                                                                                   api_secret=Keys.CODEFORCES_API_SECRET.name))
-        Result = cf.Contest_Standings(contestId=contest_id,
-                                      From=1,
-                                      count=40000,
-                                      asManager=False,
-                                      showUnofficial=False).get(auth=True)
+        Result = derive_standings(contest_id=contest_id, cache_dir=cache_dir)
         contest, problems, rows = Result.contest, Result.problems, Result.rows
         print("Contest identified: {contest_name}\n".format(contest_name=contest.name))
-        contest_data.append(rows)
     except (AssertionError, ValueError) as e:
         print("Error: Invalid usage, valid contest ID not provided.")
         print("Usage: python {file_name} <contest_id>".format(file_name=sys.argv[0]))
         exit(1)
     except cf.CFAPIError as e:
-        print("Contest with ID: {contest_id} does not exist!".format(contest_id=int(sys.argv[1])))
+        print("Contest with ID: {contest_id} does not exist!".format(contest_id=contest_id))
         print(e)
         exit(1)
     except (LoadDotenvError, MissingEnvironmentVariableError) as e:
         print(e.__str__())
         exit(1)
 
-Sheet = GSheetInterface(keyfile='../secrets/icpc-camp-service-account-creds.json',
-                        spreadsheet_title='Inter-College Competitive Programming Camp Registration (Responses)')
-
-'''
-GSheet has team_name and handles. Can generate unique key thanks to unique handles (till end of year).
-Let's make map of team_name to list of list of teams. Should be enough to uniquely determine everything.
-'''
-
-teams = defaultdict(list)
-for team in Sheet.teams:
-    teams[team.name.lower()].append(team)
-
-def get_institute(party):
-    for t in teams[party.teamName.lower()]:
-        m1 = set([m.handle.lower() for m in t.members])
-        m2 = set([m.handle.lower() for m in party.members])
-        if len(m1.intersection(m2)) > 0:
-            return t.institute
-    return None
-
-team_ratings = defaultdict(list)
-for rows in contest_data:
-    rows = [row for row in rows if row.party.teamName is not None and get_institute(row.party) is not None]
-    max_solved = max(row.points for row in rows)
-
-    group_rank = 1
-    for row in rows:
-        def get_rating(rank):
-            n = max(50, len(rows))
-            return 3000 * ((n - rank + 1) / n) * (row.points / max_solved)
-
-        def get_team(party):
-            for t in teams[party.teamName.lower()]:
-                m1 = set([m.handle.lower() for m in t.members])
-                m2 = set([m.handle.lower() for m in party.members])
-                if len(m1.intersection(m2)) > 0:
-                    return t
-            return None
-
-        if row.party.teamName is None or get_institute(row.party) is None:
-            continue
-        team_ratings[get_team(row.party)].append(get_rating(group_rank))
-        group_rank += 1
-
-MIN_CONTESTS = 5
-disq_ratings = {key: value for key, value in team_ratings.items() if len(value) < MIN_CONTESTS}
-team_ratings = {key: value for key, value in team_ratings.items() if len(value) >= MIN_CONTESTS}
-
-def compute_out(team_ratings):
-    out = []
-    for team, ratings in team_ratings.items():
-        ratings = sorted(ratings, reverse=True)[0:MIN_CONTESTS]
-        final_rating = sum(ratings) / len(ratings)
-        out.append((team, final_rating))
-    out = sorted(out, key=lambda x: x[1], reverse=True)
-    return out
+    entries = score_contest(rows)
+    if not is_finished(contest):
+        print("Contest {name} is not finished, it is not recorded in the ledger\n".format(name=contest.name))
+        provisional[contest_id] = entries
+        continue
+    # The contest is finished, so a cache_dir now holds its inputs
+    digest = cached_digest(cache_dir) if cache_dir is not None else None
+    if contest_id in Ledger.contests:
+        Ledger.replace(contest_id, entries, digest, Sheet.revision)
+    else:
+        Ledger.append(contest_id, entries, digest, Sheet.revision)
 
-qual_out = compute_out(team_ratings)
-disq_out = compute_out(disq_ratings)
+qual_out, disq_out = Ledger.standings(contests_list, provisional)
 
 def print_out(out):
-    for team, rating in out:
-        print("Team: {}".format(team.name))
-        print("Institute: {}".format(team.institute))
-        print("Members: {}".format(", ".join([member.handle for member in team.members])))
+    for key, rating in out:
+        team = current_teams.get(key)
+        if team is None:
+            # No longer registered under this name and handles, print what the key holds
+            name, *handles = key.split("#")[:-1]
+            print("Team: {}".format(name))
+            print("Institute: Unknown")
+            print("Members: {}".format(", ".join(handles)))
+        else:
+            print("Team: {}".format(team.name))
+            print("Institute: {}".format(team.institute))
+            print("Members: {}".format(", ".join([member.handle for member in team.members])))
         print("Rating: {}".format(rating))
         print("")
 
@@ -0,0 +1,205 @@
+import sys
+import os
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+from LocalStandings import derive_standings, STATUS_FILE, HEADER_FILE
+from SubmissionStore import SubmissionStore
+
+'''
+Rebuilds every artifact of a season described by a season config (see season.json):
+
+    registrations (script.py) -> status dumps -> weekly tables (gen_table.py)
+                                              -> event feeds (feed_27_8_23.py)
+                                              -> final ratings (gen_final.py)
+                                              -> submission store (SubmissionStore.py)
+
+Status dumps of finished contests are downloaded only once, and the standings are derived from them
+(see LocalStandings.py). The downloads are made one at a time before anything else, so the API call limit is
+respected. Every other artifact records a content hash of its inputs in the manifest and is rebuilt only when that
+hash changes. Contests that are not finished have no cached inputs and are always rebuilt. Weeks are independent
+of each other and are built in a process pool.
+
+Usage: python gen_season.py [<season_config>] [--force]
+'''
+
+load_dotenv()
+
+FEED_SCRIPT = os.path.abspath("../contests/feed_27_8_23.py")
+
+
+def file_digest(path: str) -> str:
+    """Get the sha256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inf:
+        for chunk in iter(lambda: inf.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inputs_digest(paths: list[str]) -> str | None:
+    """Get a single digest for a list of input files, None if any of them is missing."""
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode())
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()
+
+
+def run(cmd: list[str], cwd: str = None) -> str:
+    """Run a build step and return its stdout."""
+    print("Running: {cmd}".format(cmd=" ".join(cmd)))
+    return subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.PIPE, text=True).stdout
+
+
+def contest_cache_dir(config: dict, contest_id: int) -> str:
+    return os.path.join(config["cache_dir"], str(contest_id))
+
+
+def contest_inputs(config: dict, contest_id: int) -> list[str]:
+    """Get the downloaded files every artifact of a contest depends on."""
+    contest_dir = contest_cache_dir(config, contest_id)
+    return [os.path.join(contest_dir, STATUS_FILE), os.path.join(contest_dir, HEADER_FILE)]
+
+
+def as_manager(contest: dict) -> bool:
+    """Status of contests with a feed is downloaded as a manager, the feed needs the frozen submissions too."""
+    return contest.get("manager", bool(contest.get("feed")))
+
+
+def build_contest(contest: dict, contest_name: str, config: dict, manifest: dict, force: bool) -> dict:
+    """
+    Build the artifacts of a single contest, from its status already downloaded by derive_standings.
+    Args:
+        contest (dict): The contest entry of the season config.
+        contest_name (str): The contest name, the weekly table is named after it.
+        config (dict): The season config.
+        manifest (dict): Artifact path to the digest of the inputs it was last built from.
+        force (bool): Rebuild artifacts even if their inputs are unchanged.
+    Returns:
+        dict: Manifest entries of the artifacts that were rebuilt.
+    """
+    contest_id = contest["id"]
+    contest_dir = contest_cache_dir(config, contest_id)
+    built = {}
+
+    def build(artifact: str, inputs: list[str], cmd: list[str], cwd: str = None):
+        digest = inputs_digest(inputs)
+        if not force and digest is not None and os.path.exists(artifact) and manifest.get(artifact) == digest:
+            print("Up to date: {artifact}".format(artifact=artifact))
+            return
+        run(cmd, cwd=cwd)
+        if digest is not None:
+            built[artifact] = digest
+
+    if contest.get("table", True):
+        build(contest_name.replace(' ', '-'),
+              contest_inputs(config, contest_id) + [config["registrations"], "gen_table.py", "LocalStandings.py",
+                                                    "GSheetInterface.py"],
+              # script.py already refreshed the registrations, workers must not all re-check the sheet
+              [sys.executable, "gen_table.py", str(contest_id), contest_dir, "--no-revision-check"])
+
+    if contest.get("feed"):
+        build(contest["feed"],
+              contest_inputs(config, contest_id) + [config["team_map"], FEED_SCRIPT, "LocalStandings.py"],
+              [sys.executable, FEED_SCRIPT,
+               "--contest-id", str(contest_id),
+               "--cache-dir", os.path.abspath(contest_dir),
+               "--as-manager" if as_manager(contest) else "--no-as-manager",
+               "--feed-file", os.path.abspath(contest["feed"]),
+               "--teams-pickle", os.path.abspath(config["team_map"])],
+              cwd=os.path.dirname(FEED_SCRIPT))
+
+    return built
+
+
+def build_final(config: dict, manifest: dict, force: bool) -> dict:
+    """Build the final ratings from the standings of every contest in the season, already derived in the parent."""
+    contest_ids = [contest["id"] for contest in config["contests"]]
+    inputs = [path for contest_id in contest_ids for path in contest_inputs(config, contest_id)]
+
+    artifact = config["final"]
+    digest = inputs_digest(inputs + [config["registrations"], "gen_final.py", "LocalStandings.py",
+                                     "GSheetInterface.py", "RatingLedger.py"])
+    if not force and digest is not None and os.path.exists(artifact) and manifest.get(artifact) == digest:
+        print("Up to date: {artifact}".format(artifact=artifact))
+        return {}
+    out = run([sys.executable, "gen_final.py"] + ["{id}:{dir}".format(id=contest_id,
+                                                                     dir=contest_cache_dir(config, contest_id))
+                                                  for contest_id in contest_ids])
+    with open(artifact, 'w') as outf:
+        # Drop the per contest progress lines, keep the leaderboard only
+        outf.write(out[out.find("QUALIFIED TEAMS"):])
+    return {artifact: digest} if digest is not None else {}
+
+
+def build_store(config: dict, manifest: dict, force: bool) -> dict:
+    """Ingest the cached status dumps of the season into the submission store used for season analytics."""
+    status_files = [contest_inputs(config, contest["id"])[0] for contest in config["contests"]]
+    # Contests that are not finished have no cached status, they are ingested once they finish
+    status_files = [path for path in status_files if os.path.exists(path)]
+
+    artifact = config["submissions"]
+    digest = inputs_digest(status_files + ["SubmissionStore.py"])
+    if not force and os.path.exists(artifact) and manifest.get(artifact) == digest:
+        print("Up to date: {artifact}".format(artifact=artifact))
+        return {}
+    store = SubmissionStore(artifact)
+    for status_file in status_files:
+        print("Ingested {n} submissions from {file}".format(n=store.ingest(status_file), file=status_file))
+    store.save()
+    return {artifact: digest}
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    force = "--force" in sys.argv[1:]
+    with open(args[0] if args else "season.json", 'r') as inf:
+        config = json.load(inf)
+
+    manifest_file = os.path.join(config["cache_dir"], "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as inf:
+            manifest = json.load(inf)
+
+    def save_manifest():
+        os.makedirs(config["cache_dir"], exist_ok=True)
+        with open(manifest_file, 'w') as outf:
+            json.dump(manifest, outf, indent=2)
+
+    # Registrations are shared by every other step, refresh them first (a no-op if the sheet is unchanged).
+    run([sys.executable, "script.py"])
+
+    contests = config["contests"]
+    if contests:
+        # Workers have no shared throttle, so every contest is downloaded (and cached once finished) here, serially
+        contest_names = [derive_standings(contest_id=contest["id"], cache_dir=contest_cache_dir(config, contest["id"]),
+                                          asManager=as_manager(contest)).contest.name for contest in contests]
+
+        # Record every week as soon as it is built, so a failing week does not lose the others
+        error = None
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(contests), os.cpu_count() or 1)) as pool:
+                futures = [pool.submit(build_contest, contest, contest_name, config, manifest, force)
+                           for contest, contest_name in zip(contests, contest_names)]
+                for future in as_completed(futures):
+                    try:
+                        manifest.update(future.result())
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    save_manifest()
+        finally:
+            save_manifest()
+        if error is not None:
+            raise error
+
+    manifest.update(build_final(config, manifest, force))
+    save_manifest()
+    manifest.update(build_store(config, manifest, force))
+    save_manifest()
@@ -4,7 +4,7 @@ import os
 import cfutils.api as cf
 from enum import Enum
 from GSheetInterface import GSheetInterface
-from collections import defaultdict
+from LocalStandings import derive_standings
 from tabulate import tabulate
 import datetime
 
@@ -22,28 +22,28 @@ class Keys(Enum):
     CODEFORCES_API_SECRET = "CODEFORCES_API_SECRET"
 
 
+# --no-revision-check: use the cached registrations without checking whether the sheet changed
+check_revision = "--no-revision-check" not in sys.argv
+args = [arg for arg in sys.argv if arg != "--no-revision-check"]
 try:
-    assert (len(sys.argv) == 2)
-    assert (int(sys.argv[1]) >= 0)
+    assert (len(args) in (2, 3))
+    assert (int(args[1]) >= 0)
+    cache_dir = args[2] if len(args) == 3 else None
     if not load_dotenv():
         raise LoadDotenvError("Failed to load environment variables. Did you provide the .env file?")
     if os.getenv(Keys.CODEFORCES_API_KEY.name) is None or os.getenv(Keys.CODEFORCES_API_SECRET.name) is None:
         raise MissingEnvironmentVariableError(
             "{api_key} or {api_secret} environment variables not set.".format(api_key=Keys.CODEFORCES_API_KEY.name,
                                                                               api_secret=Keys.CODEFORCES_API_SECRET.name))
-    Result = cf.Contest_Standings(contestId=int(sys.argv[1]),
-                                  From=1,
-                                  count=40000,
-                                  asManager=False,
-                                  showUnofficial=False).get(auth=True)
+    Result = derive_standings(contest_id=int(args[1]), cache_dir=cache_dir)
     contest, problems, rows = Result.contest, Result.problems, Result.rows
     print("Contest identified: {contest_name}\nGenerating table now...".format(contest_name=contest.name))
 except (AssertionError, ValueError) as e:
     print("Error: Invalid usage, valid contest ID not provided.")
-    print("Usage: python {file_name} <contest_id>".format(file_name=sys.argv[0]))
+    print("Usage: python {file_name} <contest_id> [<cache_dir>] [--no-revision-check]".format(file_name=sys.argv[0]))
     exit(1)
 except cf.CFAPIError as e:
-    print("Contest with ID: {contest_id} does not exist!".format(contest_id=int(sys.argv[1])))
+    print("Contest with ID: {contest_id} does not exist!".format(contest_id=int(args[1])))
     print(e)
     exit(1)
 except (LoadDotenvError, MissingEnvironmentVariableError) as e:
@@ -51,27 +51,20 @@ except (LoadDotenvError, MissingEnvironmentVariableError) as e:
     exit(1)
 
 Sheet = GSheetInterface(keyfile='../secrets/icpc-camp-service-account-creds.json',
-                        spreadsheet_title='Inter-College Competitive Programming Camp Registration (Responses)')
+                        spreadsheet_title='Inter-College Competitive Programming Camp Registration (Responses)',
+                        check_revision=check_revision)
 
 '''
 GSheet has team_name and handles. Can generate unique key thanks to unique handles (till end of year).
-Let's make map of team_name to list of list of teams. Should be enough to uniquely determine everything.
+A party is resolved through the sheet's handle index, checking that the team name matches as well.
 '''
 
-teams = defaultdict(list)
-for team in Sheet.teams:
-    teams[team.name.lower()].append(team)
-
 headers = ["#", "Team", "Representing", "Rating", "=", "Penalty"] + [p.index for p in problems]
 ranklist = []
 
 def get_institute(party):
-    for t in teams[party.teamName.lower()]:
-        m1 = set([m.handle.lower() for m in t.members])
-        m2 = set([m.handle.lower() for m in party.members])
-        if len(m1.intersection(m2)) > 0:
-            return t.institute
-    return None
+    team = Sheet.find_team(party.teamName, [m.handle for m in party.members])
+    return team.institute if team is not None else None
 
 rows = [row for row in rows if row.party.teamName is not None and get_institute(row.party) is not None]
 max_solved = max(row.points for row in rows)
@@ -1,5 +1,7 @@
 from GSheetInterface import GSheetInterface
+from GymCatalog import GymCatalog
 import cfutils.api as cf
+import pickle
 import os
 import time
 from dotenv import load_dotenv
@@ -14,42 +16,95 @@ for team in Sheet.teams:
         cf_handles.add(member.handle)
     cf_handles.update(team.alts)
 
-contests_cache = 'cache/gym_contests.txt'
-os.makedirs(os.path.dirname(contests_cache), exist_ok=True)
-contests = cf.Contest_List(gym=True).get(output_file=contests_cache, load_from_file=contests_cache)
+catalog = GymCatalog()
+catalog.refresh()
+
+# Verdicts of previously evaluated gyms. Only invalid verdicts are trusted: once a registered handle is in a gym's
+# standings it stays there, while a valid gym can be done by registered handles at any time (the camp itself uses
+# them). Valid gyms are checked again on every run, but only for the registered handles, which is a small response.
+# Gyms that are new or changed in the catalog get the full standings download, and so does every candidate if
+# handles were removed from the registrations. Gyms still waiting for a full evaluation are kept as pending, so an
+# interrupted run resumes where it stopped.
+verdicts_cache = 'cache/gym_verdicts.pkl'
+SAVE_EVERY = 20
+# Registered handles sent per filtered standings request, keeps the request URL short
+HANDLES_PER_REQUEST = 500
+evaluated_watermark, evaluated_handles, verdicts, pending = 0.0, set(), {}, set()
+if os.path.exists(verdicts_cache):
+    with open(verdicts_cache, 'rb') as inf:
+        evaluated_watermark = pickle.load(inf)
+        evaluated_handles = pickle.load(inf)
+        verdicts = pickle.load(inf)
+        try:
+            pending = pickle.load(inf)
+        except EOFError:
+            pass
+
+pending.update(catalog.candidates_since(evaluated_watermark))
+if not evaluated_handles.issubset(cf_handles):
+    pending = set(catalog.candidates)
+pending.intersection_update(catalog.candidates)
+to_recheck = sorted(gym_id for gym_id, valid in verdicts.items() if valid and gym_id in catalog.candidates and
+                    gym_id not in pending)
+
+
+def save_verdicts():
+    with open(verdicts_cache, 'wb') as dump_file:
+        pickle.dump(catalog.watermark, dump_file)
+        pickle.dump(cf_handles, dump_file)
+        pickle.dump({gym_id: valid for gym_id, valid in verdicts.items() if gym_id in catalog.candidates}, dump_file)
+        pickle.dump(pending, dump_file)
 
-valid_gyms = []
-num_contests = len(contests)
 
-for num_contest, contest in enumerate(contests):
-    print(f"Processing {num_contest} / {num_contests}")
-    if contest.type != cf.ContestType.ICPC or contest.durationSeconds != 18000 or contest.difficulty is None or \
-            contest.difficulty < 4:
-        continue
+def fetch_rows(contest_id: int, handles: list[str] = None) -> list:
+    request = cf.Contest_Standings(contestId=contest_id, From=1, count=40000, asManager=True, showUnofficial=True) \
+        if handles is None else cf.Contest_Standings(contestId=contest_id, From=1, count=40000, asManager=True,
+                                                     showUnofficial=True, handles=handles)
     delay = 1
     while True:
         try:
-            standings = cf.Contest_Standings(contestId=contest.id, From=1, count=40000, asManager=True,
-                                             showUnofficial=True).get(auth=True)
-            break
+            return request.get(auth=True).rows
         except Exception as e:
             print("Network Error: ", e.__str__())
             time.sleep(delay)
             delay = min(30, delay*2)
             continue
 
-    valid = True
-    for row in standings.rows:
+
+def is_valid(contest_id: int) -> bool:
+    """Check a gym against its full standings."""
+    for row in fetch_rows(contest_id):
         for member in row.party.members:
             if member.handle in cf_handles:
-                valid = False
-                break
-        if not valid:
-            break
-    if valid:
-        valid_gyms.append((contest.id, contest.name))
-        print(valid_gyms[-1])
+                return False
+    return True
+
+
+def is_still_valid(contest_id: int) -> bool:
+    """Check a previously valid gym against its standings filtered down to the registered handles."""
+    handles = sorted(cf_handles)
+    for i in range(0, len(handles), HANDLES_PER_REQUEST):
+        if fetch_rows(contest_id, handles[i:i + HANDLES_PER_REQUEST]):
+            return False
+    return True
+
+
+to_evaluate = [(gym_id, is_valid) for gym_id in sorted(pending)] + [(gym_id, is_still_valid) for gym_id in to_recheck]
+num_contests = len(to_evaluate)
+try:
+    for num_contest, (contest_id, check) in enumerate(to_evaluate):
+        print(f"Processing {num_contest} / {num_contests}")
+        verdicts[contest_id] = valid = check(contest_id)
+        pending.discard(contest_id)
+        if valid:
+            print((contest_id, catalog.gyms[contest_id].name))
+        if (num_contest + 1) % SAVE_EVERY == 0:
+            save_verdicts()
+finally:
+    save_verdicts()
 
+valid_gyms = [(gym_id, catalog.gyms[gym_id].name) for gym_id in sorted(verdicts)
+              if verdicts[gym_id] and gym_id in catalog.candidates]
 print(valid_gyms)
 
 with open("valid-gyms.txt", "w") as outf: